@@ -1,4 +1,15 @@
 class RSA(object):
+    def __init__(self):
+        # 子密钥只与密钥有关, 同一实例内按密钥缓存, 避免每个数据块都重新生成
+        self.keysCache = {}
+
+    def getKeys(self, keyByte):
+        cacheKey = tuple(keyByte)
+        keys = self.keysCache.get(cacheKey)
+        if keys is None:
+            keys = self.keysCache[cacheKey] = self.generateKeys(keyByte)
+        return keys
+
     def generateKeys(self, keyByte):
         key = [0] * 56
         loop = [1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1]
@@ -312,7 +323,7 @@ class RSA(object):
         return fpByte
 
     def enc(self, dataByte, keyByte):
-        keys = self.generateKeys(keyByte)
+        keys = self.getKeys(keyByte)
         ipByte = self.initPermute(dataByte)
         ipLeft = []  # 32
         ipRight = []  # 32
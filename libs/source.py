@@ -1,42 +1,83 @@
+import os
 import re
+import asyncio
 import sys
-import json
 import typing
+import functools
+import importlib.util
 
 from pathlib import Path
 from urllib.parse import unquote
+from urllib.request import getproxies_environment
 from enum import Enum, auto, unique
 from datetime import datetime, timedelta, timezone
 
 import httpx
-from lxml import etree
 from loguru import logger
 
+# 优先使用 C 实现的 json 库解析座位表和接口响应, 均可直接接收 bytes
+try:
+    import orjson as jsonlib
+except ImportError:
+    try:
+        import ujson as jsonlib
+    except ImportError:
+        import json as jsonlib
+
 from .rsa import RSA  # 外部文件
 
-# 初始化logger
-# 如果 logs 文件夹不存在则创建
-logDir = Path(__file__).parent.parent / 'logs'
-if logDir.exists() is False:
-    logDir.mkdir()
-
-# 日志文件用 年-月-日 命名
-logFile = Path(logDir / f'{datetime.now().year}-{datetime.now().month}-{datetime.now().day}.log')
-
-# 日志打印、保存。 保存位置、打印格式、颜色、4天清理一次日志
-logger.configure(handlers=[
-    {
-        'sink': sys.stderr,
-        'format': '<lvl>{time:YYYY-MM-DD HH:mm:ss.SSS}</> <lvl>|</> <lvl>{message}</>',
-        'colorize': True
-    },
-    {
-        'sink': logFile,
-        'format': '<lvl>{time:YYYY-MM-DD HH:mm:ss.SSS}</> <lvl>|</> <lvl>{message}</>',
-        'colorize': False,
-        'retention': '4 days'
-    },
-])
+# 登录时用于加密的 RSA 实例, 所有用户共用以复用其子密钥缓存
+_RSA = RSA()
+
+# 预编译的正则, 避免每次调用时重复编译
+_UUID_RE = re.compile(r'[a-f\d]{8}-(?:[a-f\d]{4}-){3}[a-f\d]{12}')  # ic-cookie is a uuid
+_TICKET_RE = re.compile(r'ticket=(.*)')
+_SERVICE_RE = re.compile(r'service=(.*)')
+_UNITOKEN_RE = re.compile(r'uniToken=(.*)')
+_UUID_Q_RE = re.compile(r'uuid=(.*?)&')
+_ICCOOKIE_RE = re.compile(r'ic-cookie=(.*?);')
+_DEVNAME_RE = re.compile(r'-(.*)处')
+
+# 登录页表单中的 lt、execution 字段, 直接在响应字节上匹配, 无需构建整个 DOM
+_LT_INPUT_RE = re.compile(rb'id="lt"[^>]*value="([^"]+)"')
+_EXEC_INPUT_RE = re.compile(rb'name="execution"[^>]*value="([^"]+)"')
+# 登录后跳转到密码重置页面的标志
+_RESET_MARK = '密码重置'.encode()
+
+# 预约状态位: 64已签到 2048已暂离
+_RESV_SIGNED = 64
+_RESV_NEED_SIGN_MASK = 64 | 2048
+
+def setup_logging():
+    """
+    初始化logger, 由脚本入口调用一次
+    """
+    # 如果 logs 文件夹不存在则创建
+    logDir = Path(__file__).parent.parent / 'logs'
+    logDir.mkdir(exist_ok=True)
+
+    # 日志文件用 年-月-日 命名
+    now = datetime.now()
+    logFile = logDir / f'{now.year}-{now.month}-{now.day}.log'
+
+    # 日志打印、保存。 保存位置、打印格式、颜色、4天清理一次日志
+    handlers = [
+        {
+            'sink': logFile,
+            'format': '<lvl>{time:YYYY-MM-DD HH:mm:ss.SSS}</> <lvl>|</> <lvl>{message}</>',
+            'colorize': False,
+            'retention': '4 days'
+        },
+    ]
+    # 默认同时输出到终端: 云函数、cron、GitHub Actions 等只能通过终端输出查看日志
+    # 设置环境变量 NO_CONSOLE_LOG=1 可关闭终端输出, 只保存到文件
+    if not os.environ.get('NO_CONSOLE_LOG'):
+        handlers.insert(0, {
+            'sink': sys.stderr,
+            'format': '<lvl>{time:YYYY-MM-DD HH:mm:ss.SSS}</> <lvl>|</> <lvl>{message}</>',
+            'colorize': True
+        })
+    logger.configure(handlers=handlers)
 
 @unique
 class ReturnCode(Enum):
@@ -50,26 +91,20 @@ class ReturnCode(Enum):
     FAILED = auto()
 
     def __str__(self):
-        match self:
-            case ReturnCode.SUCCESS:
-                return "成功"
-            case ReturnCode.ALREADY_SIGNED:
-                return "重复签到"
-            # case ReturnCode.ALREADY_RESERVED:
-            #     return "已预约"
-            case ReturnCode.NO_RESERVATION:
-                return "没有预约"
-            case ReturnCode.GET_LOGIN_URL_FAILED:
-                return "获取登录url失败"
-            case ReturnCode.LOGIN_SKIPED:
-                return "跳过登录"
-            case ReturnCode.COOKIE_EXPIRED:
-                return "cookie过期"
-            case ReturnCode.FAILED:
-                return "失败"
-            case _:
-                return "未知错误"
-            
+        return _RETURN_CODE_NAMES.get(self, "未知错误")
+
+# ReturnCode 对应的描述
+_RETURN_CODE_NAMES = {
+    ReturnCode.SUCCESS: "成功",
+    ReturnCode.ALREADY_SIGNED: "重复签到",
+    # ReturnCode.ALREADY_RESERVED: "已预约",
+    ReturnCode.NO_RESERVATION: "没有预约",
+    ReturnCode.GET_LOGIN_URL_FAILED: "获取登录url失败",
+    ReturnCode.LOGIN_SKIPED: "跳过登录",
+    ReturnCode.COOKIE_EXPIRED: "cookie过期",
+    ReturnCode.FAILED: "失败",
+}
+
 def load_cookie_cache(path: str) -> dict:
     """
     从缓存文件中加载cookie
@@ -78,39 +113,153 @@ def load_cookie_cache(path: str) -> dict:
     """
     
     if Path(path).exists():
-        # ic-cookie is a uuid
-        uuid_pattern = re.compile(r'[a-f\d]{8}-(?:[a-f\d]{4}-){3}[a-f\d]{12}')
-    
+        # 一次读入整个文件, 再逐行解析
         with open(path, 'r', encoding='utf-8') as f:
-            cookies = f.readlines()
-            cookie_dict = dict()
-            for line in cookies:
-                line = line.strip().split(None, 1)
-                if len(line) != 2:
-                    logger.warning(f'[{line[0]}] cookie为空')
-                    continue
-                if not re.fullmatch(uuid_pattern, line[1]):
-                    logger.warning(f'[{line[0]}] 不是合法的cookie: {line[1]} ')
-                    continue
-
-                # cookie_dict[name] = ic_cookie
-                cookie_dict[line[0]] = line[1]
+            lines = f.read().splitlines()
+
+        cookie_dict = dict()
+        for line in lines:
+            line = line.strip().split(None, 1)
+            if not line:
+                # 跳过空行
+                continue
+            if len(line) != 2:
+                logger.warning(f'[{line[0]}] cookie为空')
+                continue
+            name, value = line
+            if not _UUID_RE.fullmatch(value):
+                logger.warning(f'[{name}] 不是合法的cookie: {value} ')
+                continue
+
+            # cookie_dict[name] = ic_cookie
+            cookie_dict[name] = value
 
         return cookie_dict
     else:
         logger.warning(f'cookie缓存文件不存在, 路径: {path}')
         return dict()
 
+# 保存每个房间和座位信息的 json 文件目录, 启动时列出一次: 文件名(小写) -> 路径
+JSON_DIR = Path(__file__).resolve().parent.parent / 'json'
+_SEAT_FILES = {p.stem.lower(): p for p in JSON_DIR.glob('*.json')}
+
+@functools.lru_cache(maxsize=32)
+def _load_seat_index(json_path: Path) -> dict:
+    """
+    加载座位 json 文件并建立索引, 每个文件只解析一次
+    :param json_path: 座位 json 文件路径
+    :return: 座位名(大写) -> {'devId': ..., 'devSn': ...}
+    """
+    with open(json_path, mode='rb') as f:
+        json_data = jsonlib.loads(f.read())
+
+    return {
+        row['devName'].upper(): {'devId': row.get('devId'), 'devSn': row.get('devSn')}
+        for row in json_data['data']
+    }
+
 def save_cookie_cache(path: str, cookies: dict):
-    with open(path, 'w+', encoding='utf-8') as f:
-        for name, cookie in cookies.items():
-            f.write(f'{name} {cookie}\n')
+    """
+    保存cookie到缓存文件
+    :param path: cookie缓存文件路径
+    :param cookies: cookie字典
+    """
+    content = ''.join(f'{name} {cookie}\n' for name, cookie in cookies.items())
+
+    # 先写入临时文件再替换, 避免写入中断导致缓存文件损坏
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
     logger.info(f'cookie缓存文件已保存到 {path}')
 
+# 上海市区, 也就是东八区，比 UTC 快 8 个小时
+SHA_TZ = timezone(timedelta(hours=8), name='Asia/Shanghai', )
+
+def _now_sha() -> typing.Tuple[datetime, datetime]:
+    """
+    :return: 今天和明天的日期(北京时间)
+    """
+    current_day = datetime.now(tz=SHA_TZ)
+    return current_day, current_day + timedelta(days=1)
+
+# 连接池与超时设置: 所有接口同属一个域名, 保持长连接并在 https 接口上启用 HTTP/2 多路复用
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=60.0)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+# HTTP/2 需要安装 h2 (httpx[http2]), 未安装时退回 HTTP/1.1
+HTTP2_ENABLED = importlib.util.find_spec('h2') is not None
+
+def _create_transport(proxy: str = None) -> httpx.AsyncHTTPTransport:
+    return httpx.AsyncHTTPTransport(
+        http2=HTTP2_ENABLED,
+        limits=HTTP_LIMITS,
+        proxy=httpx.Proxy(proxy if '://' in proxy else f'http://{proxy}') if proxy else None
+    )
+
+def _env_proxy_mounts() -> dict:
+    """
+    按环境变量 HTTP(S)_PROXY、ALL_PROXY、NO_PROXY 生成 httpx 的 mounts 规则
+    显式传入 transport 时 httpx 不再读取这些环境变量, 需要自行处理
+    """
+    proxies = getproxies_environment()
+    no_proxy = [host.strip() for host in proxies.pop('no', '').split(',') if host.strip()]
+    if '*' in no_proxy:
+        return {}
+
+    mounts = {
+        f'{scheme}://': _create_transport(url)
+        for scheme, url in proxies.items()
+        if scheme in ('http', 'https', 'all') and url
+    }
+    if mounts:
+        # 不走代理的地址, None 表示使用默认的直连连接池
+        for host in no_proxy:
+            mounts[host if '://' in host else f'all://*{host}'] = None
+    return mounts
+
+class ConnectionPool(object):
+    """
+    可在多个用户之间共享的连接池, 包含直连和环境变量中配置的代理
+    """
+    def __init__(self):
+        self.transport = _create_transport()
+        self.mounts = _env_proxy_mounts()
+
+    async def aclose(self):
+        await self.transport.aclose()
+        for transport in self.mounts.values():
+            if transport is not None:
+                await transport.aclose()
+
+def run_for_users(worker, users: list) -> list:
+    """
+    为每个用户并发执行 worker(stu, pool), 所有用户共享同一个连接池
+    本身是同步函数, 脚本的 main 可保持同步, 以便云函数等以 main(event, context) 的方式直接调用
+    :param worker: 协程函数, 参数为用户信息和共享的连接池
+    :param users: 用户信息列表
+    :return: 各用户 worker 的返回值, 顺序与 users 一致, 出现异常的用户为 None
+    """
+    return asyncio.run(_run_for_users(worker, users))
+
+async def _run_for_users(worker, users: list) -> list:
+    # 每次运行单独创建连接池, 多次调用时不会复用已关闭的连接池
+    pool = ConnectionPool()
+    try:
+        results = await asyncio.gather(*(worker(stu, pool) for stu in users), return_exceptions=True)
+    finally:
+        await pool.aclose()
+
+    for i, (stu, result) in enumerate(zip(users, results)):
+        if isinstance(result, BaseException):
+            logger.error(f"[{stu['name']}] 执行失败: {result}")
+            results[i] = None
+    return results
+
 class ZWYT(object):
-    def __init__(self, name, username, password, periods, pushplus_token, *, cookie = ''):
+    def __init__(self, name, username, password, periods, pushplus_token, *, cookie = '', pool: ConnectionPool = None):
         self.resvDev = None  # 座位编号
         self.roomId = None
+        self.appAccNo = None  # 用户的 appAccNo, 首次查询后缓存
         self.cookies = {'ic-cookie': cookie}  # 保存登录用的 cookie
         self.name = name  # 名字
         self.username = str(username)  # 学号
@@ -153,12 +302,6 @@ class ZWYT(object):
             'pushplus': 'http://www.pushplus.plus/send'
         }
 
-        # xpath 匹配规则
-        self.xpath_rules = {
-            'lt': '//input[@id="lt"]/@value',
-            'execution': '//input[@name="execution"]/@value'
-        }
-
         # 请求头
         self.headers = {
             "Host": "libbooking.gzhu.edu.cn",
@@ -171,12 +314,21 @@ class ZWYT(object):
         }
 
         # 初始化请求连接对象
-        self.rr = httpx.Client()
-
+        # 传入 pool 时复用其连接池(keep-alive), cookie 仍由每个用户的客户端单独保存, 避免登录会话互相覆盖
+        # 未传入时使用自己的连接池, 需要调用 aclose 关闭
+        self.owns_pool = pool is None
+        self.pool = pool or ConnectionPool()
+        self.rr = httpx.AsyncClient(transport=self.pool.transport, mounts=self.pool.mounts, timeout=HTTP_TIMEOUT)
 
+    async def aclose(self):
+        """
+        关闭自己创建的连接池, 共享的连接池由创建者负责关闭
+        """
+        if self.owns_pool:
+            await self.pool.aclose()
 
     # pushplus 推送消息到微信
-    def pushplus(self, title, content):
+    async def pushplus(self, title, content):
         """
         pushplus 推送消息到微信
         Args:
@@ -190,40 +342,11 @@ class ZWYT(object):
             "title": title,
             "content": content
         }
-        self.rr.get(url=self.urls['pushplus'], params=params)
-
-    # TODO: 整理请求为一个函数
-    def get_response(self, url, method, params, headers, data):
-        """
-        发起请求, 获取响应
-        url:
-        method:
-        params:
-        headers:
-        data:
-        返回数据:
-        """
-        ...
-
-    # TODO: 请求方式获取 roomId
-    def get_roomId(self):
-        """
-        获取 roomId
-        :return:
-        """
-        res = self.rr.get(url=self.urls['roomId'], headers=self.headers)
-        res = res.json()
-
-    # TODO: 请求方式获取 devId
-    def get_devId(self):
-        params = {
-            "roomIds": "100647013",
-            "resvDates": "20230514",
-            "sysKind": "8"
-        }
-
-        res = self.rr.get(url=self.urls['reserve'], params=params, headers=self.headers, timeout=60)
-        json_data = res.json()
+        # 推送失败不应影响签到/预约流程, 只记录日志
+        try:
+            await self.rr.get(url=self.urls['pushplus'], params=params)
+        except Exception as e:
+            logger.error(f'[{self.name}] pushplus推送失败: {e}')
 
     # 取对应座位的 resvDev、devSn
     def get_seat_resvDev_devSn(self, devName: str, tag: str):
@@ -231,49 +354,32 @@ class ZWYT(object):
         tag: 用于判断是预约还是签到。预约需要去json文件获取resvId、签到需要去json文件获取devSn
         devName: 座位编号. 比如 101-011、202-030、3c-011、3c-212、M301-001
         """
-        resvDev = None
         filename = devName.strip().split('-')[0]  # 移除传入的座位名头尾的空格后再分割传入的座位名称
 
-        # 预约的是琴房
-        if filename[0] == 'M':
-            json_path = Path().cwd() / 'json/琴房.json'  # 准备打开的 json 文件的路径
-        else:
-            json_path = Path().cwd() / f'json/{filename.lower()}.json'  # 准备打开的 json 文件的路径, 先用小写
-
-            if json_path.exists() is False:
-                json_path = Path().cwd() / f'json/{filename.upper()}.json'  # 准备打开的 json 文件的路径, 再用大写
-
-        # 打开对应的 json 文件
-        with open(json_path, mode='r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        # 准备打开的 json 文件的路径, 预约的是琴房则打开琴房.json, 文件名不区分大小写
+        json_path = _SEAT_FILES.get('琴房' if filename[0] == 'M' else filename.lower())
+        if json_path is None:
+            raise FileNotFoundError(f'找不到座位 {devName} 对应的json文件')
 
-        # 遍历获取对应座位的 devId
-        for i in json_data.get('data'):
-            if i.get('devName') == devName.upper() or i.get('devName') == devName.lower():
-                if tag == 'reserve':  # 预约--去json文件获取resvId
-                    resvDev = i.get('devId')
-                elif tag == 'sign':  # 签到--去json文件获取devSn
-                    resvDev = i.get('devSn')
+        # 从对应 json 文件的索引中获取座位信息
+        seat = _load_seat_index(json_path).get(devName.upper(), {})
 
-        return resvDev
+        # 预约--去json文件获取resvId、签到--去json文件获取devSn
+        return seat.get('devId' if tag == 'reserve' else 'devSn')
 
     # 获取用户 appAccNo
-    def get_person_appAccNo(self):
+    async def get_person_appAccNo(self):
         """
-        获取用户的 appAccNo
+        获取用户的 appAccNo, 同一用户只请求一次
         """
-        # 请求接口
-        res = self.rr.get(url=self.urls['userinfo'], cookies=self.cookies, timeout=60)
-        return res.json().get('data').get('accNo')
-
-    def passwordReset(self):
-       """
-       密码重置
-       """
-       ...
+        if self.appAccNo is None:
+            # 请求接口
+            res = await self.rr.get(url=self.urls['userinfo'], cookies=self.cookies)
+            self.appAccNo = jsonlib.loads(res.content).get('data').get('accNo')
+        return self.appAccNo
 
     # 登录
-    def login(self, force_login: bool = False) -> ReturnCode:
+    async def login(self, force_login: bool = False) -> ReturnCode:
         """
         登录
         """
@@ -282,17 +388,17 @@ class ZWYT(object):
             return ReturnCode.LOGIN_SKIPED
 
         try: 
-            self.get_login_url()
+            await self.get_login_url()
         except Exception as e:
             logger.error(f'[{self.name}] 获取登录url失败: {e}')
             return ReturnCode.GET_LOGIN_URL_FAILED
 
-        res = self.rr.get(url=self.urls['login_url'], timeout=60)  # 请求登录url获取一些参数
-        html = etree.HTML(res.text)
+        res = await self.rr.get(url=self.urls['login_url'])  # 请求登录url获取一些参数
+        page = res.content
 
-        lt = html.xpath(self.xpath_rules['lt'])[0]
-        execution = html.xpath(self.xpath_rules['execution'])[0]
-        rsa = RSA().strEnc(self.username + self.password + lt)  # 把密码和那些参数用RSA加密
+        lt = _LT_INPUT_RE.search(page).group(1).decode()
+        execution = _EXEC_INPUT_RE.search(page).group(1).decode()
+        rsa = _RSA.strEnc(self.username + self.password + lt)  # 把密码和那些参数用RSA加密
 
         data = {
             'rsa': rsa,
@@ -303,21 +409,23 @@ class ZWYT(object):
             '_eventId': 'submit',
         }
         url = self.urls['login_url']
-        res = self.rr.post(url=url, data=data, timeout=60)
+        res = await self.rr.post(url=url, data=data)
 
-        if re.findall('密码重置', res.text):
-            self.passwordReset()
+        if _RESET_MARK in res.content:
+            # 教务系统要求修改密码, 无法继续登录
+            logger.error(f'[{self.name}] 登录失败: 需要先修改密码')
+            return ReturnCode.FAILED
 
         location = str(res.headers.get('Location'))
-        ticket = re.findall('ticket=(.*)', location)[0]  # 获取ticket
+        ticket = _TICKET_RE.search(location).group(1)  # 获取ticket
 
-        url = f"""{re.findall('service=(.*)', url)[0]}?ticket={ticket}"""
+        url = f"{_SERVICE_RE.search(url).group(1)}?ticket={ticket}"
         url = unquote(url)
-        location = self.rr.get(url=url, timeout=60).headers.get('Location')
+        location = (await self.rr.get(url=url)).headers.get('Location')
         location = unquote(location)
 
-        unitoken = re.findall('uniToken=(.*)', str(location))[0]  # 获取unitoken
-        uuid = re.findall('uuid=(.*?)&', str(location))[0]  # 获取 uuid
+        unitoken = _UNITOKEN_RE.search(str(location)).group(1)  # 获取unitoken
+        uuid = _UUID_Q_RE.search(str(location)).group(1)  # 获取 uuid
         params = {
             "manager": "false",
             "uuid": uuid,
@@ -326,20 +434,19 @@ class ZWYT(object):
         }
 
         # 获取 ic-cookie
-        get_cookie_res = self.rr.get(
+        get_cookie_res = await self.rr.get(
             url="http://libbooking.gzhu.edu.cn/ic-web//auth/token",
             params=params,
-            headers=self.headers,
-            timeout=60
+            headers=self.headers
         )
 
         icc = get_cookie_res.headers.get('Set-Cookie')
-        self.cookies['ic-cookie'] = re.findall('ic-cookie=(.*?);', icc)[0]
+        self.cookies['ic-cookie'] = _ICCOOKIE_RE.search(icc).group(1)
 
         return ReturnCode.SUCCESS
 
     #  获取登录url
-    def get_login_url(self):
+    async def get_login_url(self):
         """
         获取登录带参数的 登录 url
         """
@@ -352,11 +459,11 @@ class ZWYT(object):
 
         # 从data里面获取一个url
         url = self.urls['findaddress']
-        address = self.rr.get(url=url, params=params, timeout=60).json().get('data')
+        address = jsonlib.loads((await self.rr.get(url=url, params=params)).content).get('data')
 
         # 将上面获取到的url 作为请求参数
         url = url = f"{self.urls['get_location']}?redirectUrl={address}"
-        res = self.rr.get(url=url, timeout=60)
+        res = await self.rr.get(url=url)
 
         self.urls['login_url'] = res.headers.get('Location')
 
@@ -366,15 +473,11 @@ class ZWYT(object):
         功能: 返回预约的日期和时间
         return: 返回一个列表, 列表里面每个元素是一个字典, 字典里面有每天的 start(开始时间) 和 end(结束时间)
         """
-        utc_now = datetime.utcnow().replace(tzinfo=timezone.utc)  # UTC 时间
-        SHA_TZ = timezone(timedelta(hours=8), name='Asia/Shanghai', )  # 上海市区, 也就是东八区，比 UTC 快 8 个小时
+        current_day, next_day = _now_sha()  # 今天、明天的日期： 北京时间
 
-        current_day = utc_now.astimezone(SHA_TZ)  # 今天的日期： 北京时间
-        next_day = current_day + timedelta(days=1)  # 明天的日期
-
-        # 获取 年、月、日
-        c_year, c_month, c_day = current_day.year, current_day.month, current_day.day
-        n_year, n_month, n_day = next_day.year, next_day.month, next_day.day
+        # 日期前缀 年-月-日, 每个时间段共用
+        c_prefix = f'{current_day.year}-{current_day.month}-{current_day.day}'
+        n_prefix = f'{next_day.year}-{next_day.month}-{next_day.day}'
 
         # 要返回的数据
         reserve_todays = []
@@ -384,24 +487,22 @@ class ZWYT(object):
         for period in self.periods:
             reserve_todays.append(
                 {
-                    'start': f"{c_year}-{c_month}-{c_day} {period[0]}",  # 今天--起始时间
-                    'end': f"{c_year}-{c_month}-{c_day} {period[-1]}"  # 今天--结束时间
+                    'start': f"{c_prefix} {period[0]}",  # 今天--起始时间
+                    'end': f"{c_prefix} {period[-1]}"  # 今天--结束时间
                 }
             )
             reserve_tomorrows.append(
                 {
-                    'start': f"{n_year}-{n_month}-{n_day} {period[0]}",  # 明天--起始时间
-                    'end': f"{n_year}-{n_month}-{n_day} {period[-1]}"  # 明天--结束时间
+                    'start': f"{n_prefix} {period[0]}",  # 明天--起始时间
+                    'end': f"{n_prefix} {period[-1]}"  # 明天--结束时间
                 },
             )
 
         return reserve_tomorrows + reserve_todays
     
     # 查询正在进行并需要签到的预约
-    def get_ahead_reservation(self):
-        utc_now = datetime.utcnow().replace(tzinfo=timezone.utc)  # UTC 时间
-        SHA_TZ = timezone(timedelta(hours=8), name='Asia/Shanghai', )  # 上海市区, 也就是东八区，比 UTC 快 8 个小时
-        current_day = utc_now.astimezone(SHA_TZ)  # 今天的日期： 北京时间
+    async def get_ahead_reservation(self):
+        current_day, _ = _now_sha()  # 今天的日期： 北京时间
 
         # 4: 已生效的预约
         needStatus = 4
@@ -409,25 +510,22 @@ class ZWYT(object):
         url = self.urls['resvinfo'].format(date=current_day, needStatus=4)
         # logger.info(f'[{self.name}] 查询url: {url}')
 
-        res = self.rr.get(
+        res = await self.rr.get(
             url=url, 
             cookies=self.cookies, 
             timeout=15
         ) # 4: 已生效的预约
-        res = res.json()
-        resv = []
+        res = jsonlib.loads(res.content)
         
         code = res.get('code')
         match code:
             case 0:
-                for item in res.get('data'):
-                    resvStatus = item.get('resvStatus')
-                    # 判断是否已签到: 
-                    # 不必判断: 1预约成功, 1024审核通过
-                    
-                    # (not 64已签到 || 2048已暂离)
-                    if (resvStatus & 64 == 0) or (resvStatus & 2048 != 0):
-                        resv.append(item)
+                # 判断是否已签到: 
+                # 不必判断: 1预约成功, 1024审核通过
+                
+                # (not 64已签到 || 2048已暂离), 即两位中不是只有64已签到
+                mask, signed = _RESV_NEED_SIGN_MASK, _RESV_SIGNED
+                resv = [item for item in res.get('data') if item['resvStatus'] & mask != signed]
             case 300:
                 # ic-cookie 已失效, 需要重新登录
                 logger.warning(f'[{self.name}] ic-cookie已失效, 需要重新登录')
@@ -446,21 +544,21 @@ class ZWYT(object):
 
         return resv[0], ReturnCode.SUCCESS
 
-    def sign_for_ahead_reservation(self) -> ReturnCode:
+    async def sign_for_ahead_reservation(self) -> ReturnCode:
         """
         为正在进行的预约签到
         """
 
-        resv, errc = self.get_ahead_reservation()
+        resv, errc = await self.get_ahead_reservation()
 
         if errc != ReturnCode.SUCCESS:
             return errc
         
         devName = resv.get('resvDevInfoList')[0].get('devName')
-        return self.sign(devName)
+        return await self.sign(devName)
 
     # 预约
-    def reserve(self, devName: str):
+    async def reserve(self, devName: str):
         """
         预约
         """
@@ -468,31 +566,37 @@ class ZWYT(object):
         self.resvDev = self.get_seat_resvDev_devSn(devName, 'reserve')
 
         # 获取用户的 appAccNo
-        appAccNo = self.get_person_appAccNo()
+        appAccNo = await self.get_person_appAccNo()
 
         print('\n')  # 换行
 
+        # 各日期共用的预约参数, 只有起止时间不同
+        base_data = {
+            "sysKind": 8,
+            "appAccNo": appAccNo,
+            "memberKind": 1,
+            "resvMember": [appAccNo],  # 读者个人编号
+            "testName": "",
+            "captcha": "",
+            "resvProperty": 0,
+            "resvDev": [self.resvDev],  # 座位编号
+            "memo": ""
+        }
+        # 请求体由 jsonlib 直接序列化, 需自行声明 Content-Type
+        headers = {**self.headers, "Content-Type": "application/json"}
+
         # 遍历所有日期, 进行预约
         for date in self.get_reserve_date():
-            json_data = {
-                "sysKind": 8,
-                "appAccNo": appAccNo,
-                "memberKind": 1,
-                "resvMember": [appAccNo],  # 读者个人编号
+            json_data = base_data | {
                 "resvBeginTime": date['start'],  # 预约起始时间
                 "resvEndTime": date['end'],  # 预约结束时间
-                "testName": "",
-                "captcha": "",
-                "resvProperty": 0,
-                "resvDev": [self.resvDev],  # 座位编号
-                "memo": ""
             }
 
             # 发起预约请求
-            res = self.rr.post(url=self.urls['reserve'], headers=self.headers, json=json_data, cookies=self.cookies, timeout=60)
+            res = await self.rr.post(url=self.urls['reserve'], headers=headers, content=jsonlib.dumps(json_data), cookies=self.cookies)
 
             # 将服务器返回数据解析为 json
-            res_json = res.json()
+            res_json = jsonlib.loads(res.content)
             message = res_json.get('message')
 
             # 预约成功
@@ -500,7 +604,7 @@ class ZWYT(object):
                 logger.success(f"[{self.name}] 预约成功: 预约了 {devName}: {json_data['resvBeginTime']} ~ {json_data['resvEndTime']}" )
 
             # 该时间段有预约了
-            elif re.findall('当前时段有预约', message):
+            elif '当前时段有预约' in message:
                 logger.warning(f"[{self.name}] 这个时段已经有了预约: {json_data['resvBeginTime']} ~ {json_data['resvEndTime']}")
 
             # 预约失败---可选择向微信推送预约失败的信息, 比如可以使用 pushplus 平台
@@ -508,7 +612,7 @@ class ZWYT(object):
                 logger.error(f"[{self.name}] 时间段: {json_data['resvBeginTime']} 预约失败 {message}")
 
     # 签到
-    def sign(self, devName: str) -> ReturnCode:
+    async def sign(self, devName: str) -> ReturnCode:
         """
         签到
         """
@@ -520,22 +624,22 @@ class ZWYT(object):
         devSn = self.get_seat_resvDev_devSn(devName, 'sign')
 
         # 登录
-        res1 = self.rr.post(url=lurl,
-                            json={"devSn": devSn, "type": "1", "bind": 0, "loginType": 2},
-                            cookies=self.cookies, timeout=60)
+        res1 = await self.rr.post(url=lurl,
+                                  json={"devSn": devSn, "type": "1", "bind": 0, "loginType": 2},
+                                  cookies=self.cookies)
 
         # 返回的json数据
-        res1_data = res1.json()
+        res1_data = jsonlib.loads(res1.content)
 
         # 预约座位的编号不对
         if res1_data.get('data') is None:
             logger.warning(f"[{self.name}] {res1_data.get('message')}")
 
             # 预约的不是当前设备, 则签到对应的座位
-            devName = re.findall("-(.*)处", res1_data.get('message'))[0]
+            devName = _DEVNAME_RE.search(res1_data.get('message')).group(1)
 
             # 调用签到函数进行签到，传入预约座位号
-            return self.sign(devName)
+            return await self.sign(devName)
 
         # 暂无预约
         if res1_data.get('data').get('reserveInfo') is None:
@@ -545,11 +649,11 @@ class ZWYT(object):
         resvId = res1_data.get('data').get('reserveInfo').get('resvId')
 
         # 签到接口
-        res2 = self.rr.post(
-            url=url, json={"resvId": resvId}, cookies=self.cookies, timeout=60)
+        res2 = await self.rr.post(
+            url=url, json={"resvId": resvId}, cookies=self.cookies)
 
         # 获取返回的信息
-        message = res2.json().get('message')
+        message = jsonlib.loads(res2.content).get('message')
 
         # 签到成功
         if message == '操作成功':
@@ -1,25 +1,43 @@
 """
 预约
 """
+from loguru import logger
+
 from libs.info import infos
-from libs.source import ZWYT
+from libs.source import ZWYT, ReturnCode, run_for_users, setup_logging
+
+
+async def reserve_user(stu: dict, pool):
+    yy = None
+    try:
+        # 初始化类示例，传入昵称、用户名、密码、时间段、推送token（推送可以为空）
+        yy = ZWYT(stu['name'], stu['sno'], stu['pwd'], stu['periods'], stu['pushplus'], pool = pool)
+
+        # 登录, 失败则不再预约
+        retc = await yy.login(force_login = True)
+        if retc in (ReturnCode.GET_LOGIN_URL_FAILED, ReturnCode.FAILED):
+            logger.error(f"[{stu['name']}] 登录失败: {retc}")
+            if stu['pushplus']:
+                await yy.pushplus(f"{stu['name']} {stu['devName']} 登录失败", str(retc))
+            return
+
+        # 调用预约函数预约，传入预约座位号
+        await yy.reserve(stu['devName'])
+    except Exception as e:
+        logger.error(f"[{stu['name']}] 预约失败: {e}")
+        if yy is not None and stu['pushplus']:
+            await yy.pushplus(f"{stu['name']} {stu['devName']} 预约失败", e)
+    finally:
+        if yy is not None:
+            await yy.aclose()
 
 
 def main(*args, **kwargs):
+    setup_logging()
+
     # 遍历 info 信息，获取每个用户的昵称、预约座位号、用户名、密码、时间段、推送token（推送可以为空）
-    for stu in infos:
-        try:
-            # 初始化类示例，传入昵称、用户名、密码、时间段、推送token（推送可以为空）
-            yy = ZWYT(stu['name'], stu['sno'], stu['pwd'], stu['periods'], stu['pushplus'])
-
-            # 调用预约函数预约，传入预约座位号
-            yy.login(force_login = True)
-            yy.reserve(stu['devName'])
-        except Exception as e:
-            print(e)
-            if stu['pushplus']:
-                yy.pushplus(f"{stu['name']} {stu['devName']} 预约失败", e)
-            continue
+    # 各用户的预约互不依赖, 并发执行
+    run_for_users(reserve_user, infos)
 
 
 if __name__ == '__main__':
@@ -4,11 +4,54 @@
 
 import argparse
 
-from libs.info import infos
-from libs.source import ZWYT, ReturnCode, load_cookie_cache, save_cookie_cache
-
+from loguru import logger
 
-def main():
+from libs.info import infos
+from libs.source import ZWYT, ReturnCode, load_cookie_cache, save_cookie_cache, run_for_users, setup_logging
+
+
+async def sign_user(stu: dict, cookie: str, pool):
+    """
+    为单个用户签到
+    :return: 重新登录后获得的ic-cookie, 未重新登录则返回None
+    """
+    name = stu['name']
+    new_cookie = None
+    yy = None
+    try:
+        # 初初始化类示例，传入昵称、用户名、密码、时间段、推送token（推送可以为空）
+        yy = ZWYT(name, stu['sno'], stu['pwd'], stu['periods'], stu['pushplus'], cookie = cookie, pool = pool)
+
+
+        # 尝试签到的次数, 不应该少于2次, 因为如果cookie过期则会导致签到失败, 需要重新登录
+        retc = ReturnCode.SUCCESS
+        for _ in range(2):
+            # 登录, 如果cookie已存在则会跳过
+            retc = await yy.login(force_login = retc == ReturnCode.COOKIE_EXPIRED)
+            if retc == ReturnCode.SUCCESS: 
+                new_cookie = yy.cookies['ic-cookie']
+            elif retc in (ReturnCode.GET_LOGIN_URL_FAILED, ReturnCode.FAILED):
+                if stu['pushplus']:
+                    await yy.pushplus(f"{name} {stu['devName']} 登录失败", str(retc))
+                break
+
+            # 签到
+            retc = await yy.sign_for_ahead_reservation()
+            if retc in (ReturnCode.SUCCESS, ReturnCode.ALREADY_SIGNED, ReturnCode.NO_RESERVATION):
+                break
+
+
+    except Exception as e:
+        logger.error(f'[{name}] 签到失败: {e}')
+        if yy is not None and stu['pushplus']:
+            await yy.pushplus(f"{name} {stu['devName']} 签到失败", e)
+    finally:
+        if yy is not None:
+            await yy.aclose()
+
+    return new_cookie
+
+def main(*args, **kwargs):
 
     parser = argparse.ArgumentParser(
         prog = 'sign.py',
@@ -28,6 +71,8 @@ def main():
 
     args = parser.parse_args()
 
+    setup_logging()
+
     target_infos = []
     
     if args.name_cookie_pairs:
@@ -36,13 +81,11 @@ def main():
             pair = pair.split(':', 1)
             targets[pair[0]] = pair[1] if len(pair) == 2 else None  
 
-        for stu in infos:
-            name = stu['name']
-            if name in targets:
-                # cookie is appointed by command line
-                if targets[name] is not None:
-                    stu['cookie'] = targets[name]
-                target_infos.append(stu)
+        target_infos = [stu for stu in infos if stu['name'] in targets]
+        for stu in target_infos:
+            # cookie is appointed by command line
+            if targets[stu['name']] is not None:
+                stu['cookie'] = targets[stu['name']]
     else:
         target_infos = infos
 
@@ -51,40 +94,19 @@ def main():
     if args.cookie is not None:
         external_cookies = load_cookie_cache(args.cookie)
 
+    # 每个用户使用的cookie: 优先使用命令行指定的, 其次使用缓存的
+    cookie_for = {stu['name']: stu.get('cookie') or external_cookies.get(stu['name'], '') for stu in target_infos}
+
     # 遍历 target_infos 信息，获取每个用户的昵称、预约座位号、用户名、密码、时间段、推送token（推送可以为空）
-    for stu in target_infos:
-        name = stu['name']
-        cookie = stu.get('cookie', external_cookies.get(name, ''))
-        try:
-            # 初初始化类示例，传入昵称、用户名、密码、时间段、推送token（推送可以为空）
-            yy = ZWYT(name, stu['sno'], stu['pwd'], stu['periods'], stu['pushplus'], cookie = cookie)
-
-
-            # 尝试签到的次数, 不应该少于2次, 因为如果cookie过期则会导致签到失败, 需要重新登录
-            retc = ReturnCode.SUCCESS
-            for _ in range(2):
-                # 登录, 如果cookie已存在则会跳过
-                retc = yy.login(force_login = retc == ReturnCode.COOKIE_EXPIRED)
-                if retc == ReturnCode.SUCCESS: 
-                    # 更新cookie
-                    external_cookies[name] = yy.cookies['ic-cookie']
-                    cookie_dirty = True
-                elif retc == ReturnCode.GET_LOGIN_URL_FAILED:
-                    if stu['pushplus']:
-                        yy.pushplus(f"{name} {stu['devName']} 登录失败", "获取登录链接失败")
-                    break
-
-                # 签到
-                retc = yy.sign_for_ahead_reservation()
-                if retc in (ReturnCode.SUCCESS, ReturnCode.ALREADY_SIGNED, ReturnCode.NO_RESERVATION):
-                    break
-
-
-        except Exception as e:
-            print(e)
-            if stu['pushplus']:
-                yy.pushplus(f"{name} {stu['devName']} 签到失败", e)
-            continue
+    # 各用户的签到流程互不依赖, 并发执行
+    results = run_for_users(lambda stu, pool: sign_user(stu, cookie_for[stu['name']], pool), target_infos)
+
+    for stu, cookie in zip(target_infos, results):
+        # 只有cookie发生变化时才需要重写缓存文件
+        if isinstance(cookie, str) and external_cookies.get(stu['name']) != cookie:
+            # 更新cookie
+            external_cookies[stu['name']] = cookie
+            cookie_dirty = True
     
     if args.cookie and cookie_dirty:
         save_cookie_cache(args.cookie, external_cookies)